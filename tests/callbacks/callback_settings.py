@@ -2,8 +2,9 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import contextlib
+import functools
 import os
-from typing import Any
+from typing import Any, Union
 from unittest import mock
 from unittest.mock import MagicMock
 
@@ -15,15 +16,20 @@ import composer.loggers
 import composer.profiler
 from composer import Callback
 from composer.callbacks import (
+    CheckpointSaver,
     EarlyStopper,
     ExportForInferenceCallback,
     FreeOutputs,
     Generate,
     ImageVisualizer,
+    LRMonitor,
     MemoryMonitor,
     MemorySnapshot,
     MLPerfCallback,
+    NaNMonitor,
     OOMObserver,
+    OptimizerMonitor,
+    RuntimeEstimator,
     SpeedMonitor,
     SystemMetricsMonitor,
     ThresholdStopper,
@@ -137,7 +143,7 @@ _callback_kwargs: dict[type[Callback], dict[str, Any]] = {
     },
     ExportForInferenceCallback: {
         'save_format': 'torchscript',
-        'save_path': '/tmp/model.pth',
+        'save_path': 'model.pth',
     },
     MLPerfCallback: {
         'root_folder': '.',
@@ -207,6 +213,38 @@ _callback_marks: dict[
     NeptuneLogger: [pytest.mark.skipif(not _NEPTUNE_INSTALLED, reason='neptune is optional')],
 }
 
+# Callbacks known to keep no instance state between calls to ``Trainer.fit()``, for which a second fit exercises
+# nothing that ``test_trains`` does not. Every other callback, including any new one, is tested across multiple fits.
+_fit_stateless_callbacks: set[type[Callback]] = {
+    FreeOutputs,
+    LRMonitor,
+    MemoryMonitor,
+    NaNMonitor,
+    OptimizerMonitor,
+}
+
+# ``(dl_size, batch_size, max_duration)`` used when smoke-testing a callback with the trainer. By default, a single
+# batch that is also a full epoch, which fires every training and eval event once. That is only enough for callbacks
+# that act on every event; callbacks that skip batches, need a window of batches, or compare across epochs or
+# checkpoints need a larger shape to reach their actual logic.
+_DEFAULT_TRAIN_SHAPE: tuple[int, int, Union[int, str]] = (2, 2, '1ba')
+
+_callback_train_shapes: dict[type[Callback], tuple[int, int, Union[int, str]]] = {
+    CheckpointSaver: (4, 2, 2),
+    # Compares the monitored metric across epochs
+    EarlyStopper: (4, 2, 2),
+    LoadCheckpoint: (4, 2, 2),
+    # Skips the first batch, then dumps the snapshot once 3 more have run, so 4 batches is the minimum
+    MemorySnapshot: (4, 2, 2),
+    MLPerfCallback: (4, 2, 2),
+    # Skips the first batch before it starts timing
+    RuntimeEstimator: (4, 2, 2),
+    # Needs ``window_size + 1`` batches before it computes throughput
+    SpeedMonitor: (4, 2, 2),
+    # Compares the monitored metric across epochs
+    ThresholdStopper: (4, 2, 2),
+}
+
 
 def _mlflow_patch():
     try:
@@ -242,6 +280,16 @@ def get_cb_kwargs(impl: type[Callback]):
     return _callback_kwargs.get(impl, {})
 
 
+def smoke_train_shape(impl: type[Callback]) -> tuple[int, int, Union[int, str]]:
+    """Returns the ``(dl_size, batch_size, max_duration)`` to use when training with ``impl``."""
+    return _callback_train_shapes.get(impl, _DEFAULT_TRAIN_SHAPE)
+
+
+def multi_fit_required(impl: type[Callback]) -> bool:
+    """Returns whether ``impl`` must be tested across multiple calls to :meth:`.Trainer.fit`."""
+    return impl not in _fit_stateless_callbacks
+
+
 def _to_pytest_param(impl):
     if impl not in _callback_marks:
         return pytest.param(impl)
@@ -250,11 +298,14 @@ def _to_pytest_param(impl):
         return pytest.param(impl, marks=marks)
 
 
+@functools.lru_cache(maxsize=None)
 def get_cbs_and_marks(callbacks: bool = False, loggers: bool = False, profilers: bool = False):
-    """Returns a list of :class:`pytest.mark.param` objects for all :class:`.Callback`.
+    """Returns a tuple of :class:`pytest.mark.param` objects for all :class:`.Callback`.
     The callbacks are correctly annotated with ``skipif`` marks for optional dependencies
     and ``filterwarning`` marks for any warnings that might be emitted and are safe to ignore
 
+    The result is cached, so repeated calls during collection do not rescan the modules.
+
     This function is meant to be used like this::
 
         import pytest
@@ -273,7 +324,7 @@ def get_cbs_and_marks(callbacks: bool = False, loggers: bool = False, profilers:
         implementations.extend(get_module_subclasses(composer.loggers, LoggerDestination))
     if profilers:
         implementations.extend(get_module_subclasses(composer.profiler, Callback))
-    ans = [_to_pytest_param(impl) for impl in implementations]
+    ans = tuple(_to_pytest_param(impl) for impl in implementations)
     if not len(ans):
         raise ValueError('callbacks, loggers, or profilers must be True')
     return ans
@@ -304,11 +355,12 @@ def get_cb_hparams_and_marks():
 
 
 def get_cb_model_and_datasets(
-    cb: Callback,
+    cb: Union[Callback, type[Callback]],
     dl_size=100,
     **default_dl_kwargs,
 ) -> tuple[ComposerModel, DataLoader, DataLoader]:
-    if isinstance(cb, Generate):
+    cb_cls = cb if isinstance(cb, type) else type(cb)
+    if issubclass(cb_cls, Generate):
         if get_device(None).name == 'cpu' and dist.get_world_size() > 1:
             pytest.xfail(
                 'GPT2 is not currently supported with DDP. See https://github.com/huggingface/transformers/issues/22482 for more details.',
@@ -319,7 +371,7 @@ def get_cb_model_and_datasets(
             dummy_gpt_lm_dataloader(size=dl_size),
         )
     model = SimpleModel()
-    if isinstance(cb, FreeOutputs):
+    if issubclass(cb_cls, FreeOutputs):
         model.get_metrics = lambda is_train=False: {}
     return (
         model,
@@ -1,78 +1,230 @@
 # Copyright 2022 MosaicML Composer authors
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import cast
+import contextlib
+import copy
+import functools
+import urllib.parse
+from typing import Callable, cast
 
 import pytest
+from torch.utils.data import DataLoader
 
 from composer.core import Callback, Engine, Event, State
 from composer.core.time import Time
-from composer.loggers import Logger, LoggerDestination
+from composer.loggers import Logger, LoggerDestination, MLFlowLogger
+from composer.models import ComposerModel
 from composer.profiler import Profiler, ProfilerAction
 from composer.trainer import Trainer
 from tests.callbacks.callback_settings import (
+    _WANDB_INSTALLED,
     get_cb_kwargs,
     get_cb_model_and_datasets,
     get_cb_patches,
     get_cbs_and_marks,
+    multi_fit_required,
+    smoke_train_shape,
 )
 from tests.common import EventCounterCallback
 
+_ALL_CBS = get_cbs_and_marks(callbacks=True, loggers=True, profilers=True)
+
+
+def _skip_schedule(state: State) -> ProfilerAction:
+    del state  # unused
+    return ProfilerAction.SKIP
+
+
+def _null_profiler() -> Profiler:
+    """A :class:`.Profiler` that never records.
+
+    A new instance is returned on each call, rather than sharing one, as the profiler records markers against the
+    state it is bound to and is closed along with the engine.
+    """
+    return Profiler(schedule=_skip_schedule, trace_handlers=[], torch_prof_memory_filename=None)
+
+
+@contextlib.contextmanager
+def _temp_callback(state: State, callback: Callback):
+    """Adds ``callback`` to ``state`` for the duration of the context.
+
+    On exit, ``state.callbacks`` and ``state.profiler`` are restored to what they were on entry, including anything
+    added while the context was active (e.g. by :meth:`.Profiler.bind_to_state`).
+    """
+    callbacks = list(state.callbacks)
+    profiler = state.profiler
+    state.callbacks.append(callback)
+    try:
+        yield
+    finally:
+        state.callbacks = callbacks
+        state.profiler = profiler
+
+
+def _dispose_mlflow_store():
+    """Release the connection pool of the tracking store, if it is backed by a database.
+
+    Only database tracking URIs are handled, so the file store set up for each test by the autouse
+    ``setup_mlflow_tracking`` fixture is never constructed (``_get_store`` would create it) just to be discarded.
+    """
+    import mlflow
+    from mlflow.store.db.db_types import DATABASE_ENGINES
+
+    scheme = urllib.parse.urlparse(mlflow.get_tracking_uri()).scheme
+    # SQLAlchemy URIs may name a driver, e.g. ``postgresql+psycopg2://``
+    if scheme.split('+')[0] not in DATABASE_ENGINES:
+        return
+
+    try:
+        from mlflow.tracking._tracking_service.utils import _get_store
+        engine = getattr(_get_store(), 'engine', None)
+    except (ImportError, AttributeError):
+        # ``_get_store`` is a private MLflow API and may move between versions
+        return
+    if engine is not None:
+        engine.dispose()
+
 
 @pytest.fixture
-def clean_mlflow_runs():
+def clean_mlflow_runs(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch):
     """Clean up MLflow runs before and after tests.
 
     This fixture ensures no MLflow runs persist between tests,
-    which prevents "Run already active" errors.
+    which prevents "Run already active" errors. On teardown, the connection pool of a database-backed
+    tracking store (if one is configured) is disposed, so pools do not accumulate across tests.
+
+    The cleanup is skipped for callbacks other than :class:`.MLFlowLogger`, as they never start an MLflow run.
     """
+    callspec = getattr(request.node, 'callspec', None)
+    cb_cls = callspec.params.get('cb_cls') if callspec is not None else None
+    if cb_cls is None or not issubclass(cb_cls, MLFlowLogger):
+        yield
+        return
+
+    # MLFlowLogger tests are skipped when mlflow is not installed, so the import always succeeds here
+    import mlflow
+
+    monkeypatch.setenv('MLFLOW_SQLALCHEMYSTORE_POOL_SIZE', '1')
     try:
-        import mlflow
-        try:
-            while mlflow.active_run():
-                mlflow.end_run()
-        except Exception:
-            pass
+        while mlflow.active_run():
+            mlflow.end_run()
+    except Exception:
+        pass
 
-        yield
+    yield
 
-        try:
-            while mlflow.active_run():
-                mlflow.end_run()
-        except Exception:
-            pass
-    except ImportError:
-        yield
+    try:
+        while mlflow.active_run():
+            mlflow.end_run()
+    except Exception:
+        pass
+
+    _dispose_mlflow_store()
+
+
+@functools.lru_cache(maxsize=None)
+def _build_cb_model_and_datasets(cb_cls: type[Callback], dl_size: int, batch_size: int):
+    return get_cb_model_and_datasets(cb_cls, dl_size=dl_size, batch_size=batch_size)
+
+
+@pytest.fixture(scope='session')
+def cb_model_and_datasets():
+    """Returns a builder for the model and dataloaders used to train a callback.
+
+    The model and dataloaders are built once per ``(cb_cls, dl_size, batch_size)`` and shared across tests.
+    Each call returns a fresh copy of the model, so training in one test does not leak into another.
+    """
+
+    def build(cb_cls: type[Callback], dl_size: int, batch_size: int) -> tuple[ComposerModel, DataLoader, DataLoader]:
+        model, train_dataloader, eval_dataloader = _build_cb_model_and_datasets(cb_cls, dl_size, batch_size)
+        return copy.deepcopy(model), train_dataloader, eval_dataloader
+
+    yield build
+
+    _build_cb_model_and_datasets.cache_clear()
+
+
+@pytest.fixture
+def trainer_factory(cb_model_and_datasets: Callable[..., tuple[ComposerModel, DataLoader, DataLoader]]):
+    """Returns a function that builds a :class:`.Trainer` to smoke-test a callback.
+
+    Each call builds a new trainer, as training with a callback mutates it (and the trainer state) irreversibly.
+    """
+
+    def make(cb: Callback, device_train_microbatch_size: int) -> Trainer:
+        loggers = cb if isinstance(cb, LoggerDestination) else None
+        callbacks = cb if not isinstance(cb, LoggerDestination) else None
+
+        dl_size, batch_size, max_duration = smoke_train_shape(type(cb))
+        model, train_dataloader, eval_dataloader = cb_model_and_datasets(
+            type(cb),
+            dl_size=dl_size,
+            batch_size=batch_size,
+        )
+
+        return Trainer(
+            model=model,
+            train_dataloader=train_dataloader,
+            eval_dataloader=eval_dataloader,
+            max_duration=max_duration,
+            device_train_microbatch_size=device_train_microbatch_size,
+            callbacks=callbacks,
+            loggers=loggers,
+            profiler=_null_profiler(),
+        )
+
+    return make
+
+
+@pytest.fixture
+def fit_lifecycle_engine(cb_cls: type[Callback], dummy_state: State, clean_mlflow_runs):
+    """An :class:`.Engine` over ``dummy_state`` with an instance of ``cb_cls`` and a no-op profiler attached.
+
+    Depends on ``clean_mlflow_runs`` so any MLflow cleanup happens before the callback is constructed.
+
+    Yields the engine and a ``run_fit_pair`` helper that runs ``Event.FIT_START`` then ``Event.FIT_END`` on it.
+    The callback's patches stay active for the lifetime of the fixture, and the engine is closed on teardown;
+    :meth:`.Engine.close` is idempotent, so this is safe for tests that close the engine themselves.
+    """
+    maybe_patch_context = get_cb_patches(cb_cls)
+    with maybe_patch_context:
+        cb_kwargs = get_cb_kwargs(cb_cls)
+        with _temp_callback(dummy_state, cb_cls(**cb_kwargs)):
+            dummy_state.profiler = _null_profiler()
+            dummy_state.profiler.bind_to_state(dummy_state)
+
+            logger = Logger(dummy_state)
+            engine = Engine(state=dummy_state, logger=logger)
+
+            def run_fit_pair():
+                engine.run_event(Event.FIT_START)
+                engine.run_event(Event.FIT_END)
 
+            yield engine, run_fit_pair
 
-def test_callbacks_map_to_events():
-    # callback methods must be 1:1 mapping with events
-    # exception for private methods
-    cb = Callback()
-    excluded_methods = ['state_dict', 'load_state_dict', 'run_event', 'close', 'post_close']
-    methods = {m for m in dir(cb) if (m not in excluded_methods and not m.startswith('_'))}
-    event_names = {e.value for e in Event}
-    assert methods == event_names
+            engine.close()
 
 
-@pytest.mark.parametrize('event', list(Event))
-def test_run_event_callbacks(event: Event, dummy_state: State):
+def test_run_event_callbacks(dummy_state: State):
+    # Run every event through a single engine, rather than building an engine per event
     callback = EventCounterCallback()
     logger = Logger(dummy_state)
-    dummy_state.callbacks = [callback]
-    engine = Engine(state=dummy_state, logger=logger)
+    with _temp_callback(dummy_state, callback):
+        engine = Engine(state=dummy_state, logger=logger)
 
-    engine.run_event(event)
+        for event in Event:
+            engine.run_event(event)
 
-    assert callback.event_to_num_calls[event] == 1
+    assert callback.event_to_num_calls == {event: 1 for event in Event}
 
 
-@pytest.mark.parametrize('cb_cls', get_cbs_and_marks(callbacks=True, loggers=True, profilers=True))
+@pytest.mark.parametrize('cb_cls', _ALL_CBS)
 class TestCallbacks:
 
     @classmethod
     def setup_class(cls):
-        pytest.importorskip('wandb', reason='WandB is optional.')
+        if not _WANDB_INSTALLED:
+            pytest.skip('WandB is optional.')
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
     def test_callback_is_constructable(self, cb_cls: type[Callback]):
@@ -82,123 +234,56 @@ class TestCallbacks:
         assert isinstance(cb, cb_cls)
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
-    def test_multiple_fit_start_and_end(self, cb_cls: type[Callback], dummy_state: State):
+    def test_multiple_fit_start_and_end(self, fit_lifecycle_engine: tuple[Engine, Callable[[], None]]):
         """Test that callbacks do not crash when Event.FIT_START and Event.FIT_END is called multiple times."""
-        maybe_patch_context = get_cb_patches(cb_cls)
-        with maybe_patch_context:
-            cb_kwargs = get_cb_kwargs(cb_cls)
-            dummy_state.callbacks.append(cb_cls(**cb_kwargs))
-            dummy_state.profiler = Profiler(
-                schedule=lambda _: ProfilerAction.SKIP,
-                trace_handlers=[],
-                torch_prof_memory_filename=None,
-            )
-            dummy_state.profiler.bind_to_state(dummy_state)
-
-            logger = Logger(dummy_state)
-            engine = Engine(state=dummy_state, logger=logger)
+        engine, run_fit_pair = fit_lifecycle_engine
+        engine.run_event(Event.INIT)  # always runs just once per engine
 
-            engine.run_event(Event.INIT)  # always runs just once per engine
-
-            engine.run_event(Event.FIT_START)
-            engine.run_event(Event.FIT_END)
-
-            engine.run_event(Event.FIT_START)
-            engine.run_event(Event.FIT_END)
+        run_fit_pair()
+        run_fit_pair()
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
-    def test_idempotent_close(self, cb_cls: type[Callback], dummy_state: State, clean_mlflow_runs):
+    def test_idempotent_close(self, fit_lifecycle_engine: tuple[Engine, Callable[[], None]]):
         """Test that callbacks do not crash when .close() and .post_close() are called multiple times."""
-        maybe_patch_context = get_cb_patches(cb_cls)
-        with maybe_patch_context:
-            cb_kwargs = get_cb_kwargs(cb_cls)
-            dummy_state.callbacks.append(cb_cls(**cb_kwargs))
-            dummy_state.profiler = Profiler(
-                schedule=lambda _: ProfilerAction.SKIP,
-                trace_handlers=[],
-                torch_prof_memory_filename=None,
-            )
-            dummy_state.profiler.bind_to_state(dummy_state)
-
-            logger = Logger(dummy_state)
-            engine = Engine(state=dummy_state, logger=logger)
-
-            maybe_patch_context = get_cb_patches(cb_cls)
-            with maybe_patch_context:
-                engine.run_event(Event.INIT)
-                engine.close()
-                engine.close()
+        engine, _ = fit_lifecycle_engine
+        engine.run_event(Event.INIT)
+        engine.close()
+        engine.close()
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
-    def test_multiple_init_and_close(self, cb_cls: type[Callback], dummy_state: State, clean_mlflow_runs):
+    def test_multiple_init_and_close(self, fit_lifecycle_engine: tuple[Engine, Callable[[], None]]):
         """Test that callbacks do not crash when INIT/.close()/.post_close() are called multiple times in that order."""
-        maybe_patch_context = get_cb_patches(cb_cls)
-        with maybe_patch_context:
-            cb_kwargs = get_cb_kwargs(cb_cls)
-            dummy_state.callbacks.append(cb_cls(**cb_kwargs))
-            dummy_state.profiler = Profiler(
-                schedule=lambda _: ProfilerAction.SKIP,
-                trace_handlers=[],
-                torch_prof_memory_filename=None,
-            )
-            dummy_state.profiler.bind_to_state(dummy_state)
+        engine, _ = fit_lifecycle_engine
+        engine.run_event(Event.INIT)
+        engine.close()
+        # For good measure, also test idempotent close, in case if there are edge cases with a second call to INIT
+        engine.close()
 
-            logger = Logger(dummy_state)
-            engine = Engine(state=dummy_state, logger=logger)
-
-            maybe_patch_context = get_cb_patches(cb_cls)
-            with maybe_patch_context:
-                engine.run_event(Event.INIT)
-                engine.close()
-                # For good measure, also test idempotent close, in case if there are edge cases with a second call to INIT
-                engine.close()
-
-                # Create a new engine, since the engine does allow events to run after it has been closed
-                engine = Engine(state=dummy_state, logger=logger)
-                engine.close()
-                # For good measure, also test idempotent close, in case if there are edge cases with a second call to INIT
-                engine.close()
-
-
-@pytest.mark.parametrize('cb_cls', get_cbs_and_marks(callbacks=True, loggers=True, profilers=True))
-# Parameterized across @pytest.mark.remote as some loggers (e.g. wandb) support integration testing
-@pytest.mark.parametrize(
-    'device_train_microbatch_size,_remote',
-    [(1, False), (2, False), pytest.param(1, True, marks=pytest.mark.remote)],
-)
-@pytest.mark.filterwarnings(r'ignore:The profiler is enabled:UserWarning')
-class TestCallbackTrains:
+        # Create a new engine, since the engine does allow events to run after it has been closed
+        engine = Engine(state=engine.state, logger=engine.logger)
+        engine.close()
+        # For good measure, also test idempotent close, in case if there are edge cases with a second call to INIT
+        engine.close()
 
-    def _get_trainer(self, cb: Callback, device_train_microbatch_size: int):
-        loggers = cb if isinstance(cb, LoggerDestination) else None
-        callbacks = cb if not isinstance(cb, LoggerDestination) else None
 
-        model, train_dataloader, eval_dataloader = get_cb_model_and_datasets(cb, dl_size=4, batch_size=2)
-
-        return Trainer(
-            model=model,
-            train_dataloader=train_dataloader,
-            eval_dataloader=eval_dataloader,
-            max_duration=2,
-            device_train_microbatch_size=device_train_microbatch_size,
-            callbacks=callbacks,
-            loggers=loggers,
-            profiler=Profiler(
-                schedule=lambda _: ProfilerAction.SKIP,
-                trace_handlers=[],
-                torch_prof_memory_filename=None,
-            ),
-        )
+class _CallbackTrainsTests:
+    """Tests that train with each callback. Subclassed by :class:`TestCallbackTrains` and
+    :class:`TestCallbackTrainsRemote`, which provide the parametrization."""
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
-    def test_trains(self, cb_cls: type[Callback], device_train_microbatch_size: int, _remote: bool, clean_mlflow_runs):
-        del _remote  # unused. `_remote` must be passed through to parameterize the test markers.
+    def test_trains(
+        self,
+        cb_cls: type[Callback],
+        device_train_microbatch_size: int,
+        clean_mlflow_runs,
+        trainer_factory: Callable[[Callback, int], Trainer],
+    ):
         cb_kwargs = get_cb_kwargs(cb_cls)
         cb = cb_cls(**cb_kwargs)
 
         maybe_patch_context = get_cb_patches(cb_cls)
         with maybe_patch_context:
-            trainer = self._get_trainer(cb, device_train_microbatch_size)
+            trainer = trainer_factory(cb, device_train_microbatch_size)
             trainer.fit()
 
     @pytest.mark.filterwarnings('ignore::UserWarning')
@@ -206,22 +291,64 @@ class TestCallbackTrains:
         self,
         cb_cls: type[Callback],
         device_train_microbatch_size: int,
-        _remote: bool,
         clean_mlflow_runs,
+        trainer_factory: Callable[[Callback, int], Trainer],
     ):
         """
         Tests that training with multiple fits complete. Note: future functional tests should test for idempotency (e.g functionally)
         """
-        del _remote  # unused. `_remote` must be passed through to parameterize the test markers.
+        if not multi_fit_required(cb_cls):
+            pytest.skip(f'{cb_cls.__name__} keeps no state across fits, so it is covered by test_trains.')
+
         cb_kwargs = get_cb_kwargs(cb_cls)
         cb = cb_cls(**cb_kwargs)
 
         maybe_patch_context = get_cb_patches(cb_cls)
         with maybe_patch_context:
-            trainer = self._get_trainer(cb, device_train_microbatch_size)
+            trainer = trainer_factory(cb, device_train_microbatch_size)
             trainer.fit()
 
             assert trainer.state.max_duration is not None
             trainer.state.max_duration = cast(Time[int], trainer.state.max_duration * 2)
 
             trainer.fit()
+
+
+@pytest.mark.parametrize('cb_cls', _ALL_CBS)
+# Microbatching is orthogonal to callback correctness, so only one microbatch size is run per callback;
+# both sizes are covered once by TestMicrobatchSweep.
+@pytest.mark.parametrize('device_train_microbatch_size', [2])
+@pytest.mark.filterwarnings(r'ignore:The profiler is enabled:UserWarning')
+class TestCallbackTrains(_CallbackTrainsTests):
+    pass
+
+
+# Kept separate from TestCallbackTrains so the remote cases can be selected or excluded as a whole class,
+# as some loggers (e.g. wandb) support integration testing
+@pytest.mark.remote
+@pytest.mark.parametrize('cb_cls', _ALL_CBS)
+@pytest.mark.parametrize('device_train_microbatch_size', [1])
+@pytest.mark.filterwarnings(r'ignore:The profiler is enabled:UserWarning')
+class TestCallbackTrainsRemote(_CallbackTrainsTests):
+    pass
+
+
+@pytest.mark.parametrize('device_train_microbatch_size', [1, 2])
+class TestMicrobatchSweep:
+
+    def test_trains(self, device_train_microbatch_size: int, cb_model_and_datasets):
+        cb = EventCounterCallback()
+        model, train_dataloader, eval_dataloader = cb_model_and_datasets(type(cb), dl_size=4, batch_size=2)
+        trainer = Trainer(
+            model=model,
+            train_dataloader=train_dataloader,
+            eval_dataloader=eval_dataloader,
+            max_duration=2,
+            device_train_microbatch_size=device_train_microbatch_size,
+            callbacks=cb,
+        )
+        trainer.fit()
+
+        num_batches = 4  # 2 batches per epoch for 2 epochs
+        assert cb.event_to_num_calls[Event.BATCH_START] == num_batches
+        assert cb.event_to_num_calls[Event.BEFORE_FORWARD] == num_batches * (2 // device_train_microbatch_size)
@@ -6,6 +6,7 @@ from typing import Optional
 
 import pytest
 
+from composer.core import Callback, Event
 from composer.utils import reproducibility
 
 # Allowed options for pytest.mark.world_size()
@@ -95,6 +96,24 @@ def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item
         items[:] = remaining
 
 
+def _check_callbacks_map_to_events():
+    """Callback methods must be a 1:1 mapping with events, except for private and non-event methods.
+
+    This is a static property of :class:`.Callback` and :class:`.Event`, so it is checked once per session
+    rather than as a test.
+    """
+    non_event_methods = {'state_dict', 'load_state_dict', 'run_event', 'close', 'post_close'}
+    # ``vars`` only lists what Callback defines itself, avoiding a ``dir`` walk over the MRO
+    methods = {m for m in vars(Callback) if not m.startswith('_') and m not in non_event_methods}
+    event_names = {e.value for e in Event}
+    if methods != event_names:
+        raise pytest.UsageError(
+            'Callback methods must map 1:1 to events. '
+            f'Methods without an event: {sorted(methods - event_names)}. '
+            f'Events without a method: {sorted(event_names - methods)}.',
+        )
+
+
 # Note: These methods are an alternative to the tiny_bert fixtures in fixtures.py.
 # Fixtures cannot be used natively as parametrized inputs, which we require when
 # we wish to run a test across multiple models, one of which is a HuggingFace BERT Tiny.
@@ -102,6 +121,8 @@ def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item
 # use pytest.{var}, but instead should import and use the helper copy methods configure_{var}
 # (in tests.common.models) so the objects in the PyTest namespace do not change.
 def pytest_configure():
+    _check_callbacks_map_to_events()
+
     try:
         import transformers
         del transformers